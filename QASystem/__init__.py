@@ -7,14 +7,17 @@ This package provides:
 - Document ingestion and indexing
 - Retrieval and generation pipeline
 - Utility functions for configuration
+- A shared thread pool (IO_POOL) for I/O-bound work
 """
 
-from QASystem.utility import pinecone_config
-from QASystem.retrievalandgenerator import get_result
+from QASystem.utility import IO_POOL, pinecone_config
+from QASystem.retrievalandgenerator import get_result, stream_result
 from QASystem.ingestion import ingest_documents
 
 __all__ = [
+    "IO_POOL",
     "pinecone_config",
     "get_result", 
+    "stream_result",
     "ingest_documents"
 ]
@@ -0,0 +1,61 @@
+"""
+Logging
+=======
+Package logger for QASystem.
+
+Records are put on a queue and written by a background listener thread, so
+callers on hot paths only pay for a queue put.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Optional log file path (empty logs to stderr only) and level
+LOG_FILE = os.getenv("QA_LOG_FILE", "")
+LOG_LEVEL = os.getenv("QA_LOG_LEVEL", "INFO").upper()
+
+log = logging.getLogger("qasystem")
+
+
+def _configure() -> None:
+    if log.handlers:
+        return
+
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if LOG_FILE:
+        log_dir = os.path.dirname(LOG_FILE)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        handlers.append(RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=10 * 1024 * 1024,
+            backupCount=3,
+            encoding="utf-8"
+        ))
+
+    formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    log.addHandler(QueueHandler(records))
+    # Unknown level names fall back to INFO instead of failing the import
+    level = logging.getLevelName(LOG_LEVEL)
+    log.setLevel(level if isinstance(level, int) else logging.INFO)
+    log.propagate = False
+
+
+_configure()
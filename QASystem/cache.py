@@ -0,0 +1,111 @@
+"""
+Query Cache
+===========
+Thread-safe LRU cache with per-entry TTL, used to serve repeated questions
+without re-running the RAG pipeline, and the normalized query key shared by
+the answer and embedding caches.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Hashable, Optional
+
+
+def normalize_query(question: str) -> str:
+    """
+    Normalize a question so trivially different spellings share a cache entry.
+
+    Args:
+        question: The raw user question.
+
+    Returns:
+        The stripped, lower-cased question with whitespace runs collapsed.
+    """
+    return re.sub(r"\s+", " ", question.strip().lower())
+
+
+@dataclass(frozen=True, slots=True)
+class QueryKey:
+    """
+    A question normalized and hashed once per request.
+
+    Equality compares the normalized text; the hash is a precomputed BLAKE2b
+    digest, so dictionary and cache lookups never rehash the string.
+
+    Attributes:
+        text: The normalized question.
+        digest: 64-bit BLAKE2b hash of ``text``.
+    """
+
+    text: str
+    digest: int = field(compare=False)
+
+    def __hash__(self) -> int:
+        return self.digest
+
+    @classmethod
+    def from_question(cls, question: str) -> "QueryKey":
+        """
+        Build the key for a raw user question.
+        """
+        text = normalize_query(question)
+        digest = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+        return cls(text=text, digest=digest)
+
+
+class QueryCache:
+    """
+    LRU cache whose entries also expire after a time-to-live.
+
+    Args:
+        max_size: Maximum number of entries kept before the least recently
+                  used one is evicted.
+        ttl: Default time-to-live in seconds for new entries.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Return the cached value for a key, or None if missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry when full.
+        """
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,449 @@
+"""
+Custom Pipeline Components
+==========================
+Haystack components used by the ingestion and RAG pipelines.
+"""
+
+import hashlib
+import shelve
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import lru_cache
+from typing import List, Optional, Set
+
+from haystack import Document, component
+from haystack.dataclasses import ChatMessage
+from haystack.document_stores.types import DuplicatePolicy
+
+from QASystem.utility import IO_POOL
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str):
+    """
+    Load a Hugging Face tokenizer once per model and reuse it.
+
+    Args:
+        model: Hugging Face model id.
+
+    Returns:
+        The tokenizer instance.
+    """
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """
+    Load a tiktoken encoding once per model and reuse it.
+
+    Args:
+        model: Model name used to pick the encoding.
+
+    Returns:
+        The tiktoken encoding, falling back to cl100k_base for unknown models.
+    """
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _sent_tokenize(text: str) -> List[str]:
+    import nltk
+
+    try:
+        return nltk.sent_tokenize(text)
+    except LookupError:
+        # Sentence models are not bundled with nltk; fetch them on first use
+        nltk.download("punkt", quiet=True)
+        nltk.download("punkt_tab", quiet=True)
+        return nltk.sent_tokenize(text)
+
+
+@component
+class TokenAwareSplitter:
+    """
+    Split documents into chunks sized in tokens of the embedding model.
+
+    Sentences are packed greedily until a chunk reaches ``split_length``
+    tokens; sentences too long to fit in a chunk on their own are cut into
+    token windows. Each chunk after the first starts with the last
+    ``split_overlap`` tokens of the previous one, and a final chunk with
+    fewer than ``min_length`` new tokens is merged into the previous one
+    (which may then exceed ``split_length`` by less than ``min_length``).
+
+    Args:
+        model: Hugging Face model id whose tokenizer counts tokens.
+        split_length: Target maximum number of tokens per chunk.
+        split_overlap: Number of tokens repeated between consecutive chunks.
+        min_length: Chunks with fewer new tokens than this are merged backwards.
+    """
+
+    def __init__(
+        self,
+        model: str = "sentence-transformers/all-mpnet-base-v2",
+        split_length: int = 300,
+        split_overlap: int = 15,
+        min_length: int = 30
+    ):
+        if not 0 <= split_overlap < split_length:
+            raise ValueError("split_overlap must be at least 0 and smaller than split_length.")
+        self.model = model
+        self.split_length = split_length
+        self.split_overlap = split_overlap
+        self.min_length = min_length
+
+    def warm_up(self) -> None:
+        """
+        Load the tokenizer and sentence models before the first run.
+        """
+        get_tokenizer(self.model)
+        _sent_tokenize("Warm up.")
+
+    def _split(self, text: str) -> List[str]:
+        sentences = [sentence for sentence in _sent_tokenize(text) if sentence.strip()]
+        if not sentences:
+            return []
+
+        tokenizer = get_tokenizer(self.model)
+        # Character offsets let chunks be sliced from the original text;
+        # decoding token ids would lower-case and re-space it
+        offsets = tokenizer(
+            sentences, add_special_tokens=False, return_offsets_mapping=True
+        )["offset_mapping"]
+
+        # A span is (sentence index, first token, end token) of a sentence
+        chunks = []
+        current = []
+        current_tokens = 0
+        new_tokens = 0
+
+        def close_chunk():
+            # Start the next chunk with the last split_overlap tokens of this one
+            nonlocal current, current_tokens, new_tokens
+            chunks.append((current, new_tokens))
+            current = self._overlap(current, self.split_overlap)
+            current_tokens = sum(end - start for _, start, end in current)
+            new_tokens = 0
+
+        for i, sentence_offsets in enumerate(offsets):
+            count = len(sentence_offsets)
+            if new_tokens and current_tokens + count > self.split_length:
+                close_chunk()
+
+            # Sentences that do not fit in a chunk on their own are cut into token windows
+            start = 0
+            while start < count:
+                take = min(count - start, self.split_length - current_tokens)
+                current.append((i, start, start + take))
+                current_tokens += take
+                new_tokens += take
+                start += take
+                if start < count:
+                    close_chunk()
+
+        if current:
+            if chunks and new_tokens < self.min_length:
+                chunks[-1][0].extend(current[len(current) - self._tail_length(current, new_tokens):])
+            else:
+                chunks.append((current, new_tokens))
+
+        return [self._render(chunk, sentences, offsets) for chunk, _ in chunks]
+
+    @staticmethod
+    def _overlap(spans, tokens: int):
+        # The last `tokens` tokens of a chunk, as spans in reading order
+        overlap = []
+        for i, start, end in reversed(spans):
+            if tokens <= 0:
+                break
+            take = min(tokens, end - start)
+            overlap.insert(0, (i, end - take, end))
+            tokens -= take
+        return overlap
+
+    @staticmethod
+    def _tail_length(spans, new_tokens: int) -> int:
+        # Number of trailing spans holding the chunk's new (non-overlap) tokens
+        count = 0
+        for i, start, end in reversed(spans):
+            if new_tokens <= 0:
+                break
+            new_tokens -= end - start
+            count += 1
+        return count
+
+    @staticmethod
+    def _render(spans, sentences: List[str], offsets) -> str:
+        # Merge contiguous spans of the same sentence, then slice the original text
+        merged = []
+        for i, start, end in spans:
+            if merged and merged[-1][0] == i and merged[-1][2] >= start:
+                merged[-1] = (i, merged[-1][1], max(merged[-1][2], end))
+            else:
+                merged.append((i, start, end))
+        return " ".join(
+            sentences[i][offsets[i][start][0]:offsets[i][end - 1][1]]
+            for i, start, end in merged
+        )
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        """
+        Split documents into token-sized chunks.
+
+        Args:
+            documents: Documents to split.
+
+        Returns:
+            Dictionary with the list of chunk documents.
+        """
+        split_docs = []
+        for doc in documents:
+            if not doc.content:
+                continue
+            for split_id, chunk in enumerate(self._split(doc.content)):
+                split_docs.append(Document(
+                    content=chunk,
+                    meta={**doc.meta, "source_id": doc.id, "split_id": split_id}
+                ))
+
+        return {"documents": split_docs}
+
+
+@component
+class ContentDeduper:
+    """
+    Drop documents whose content has already been seen.
+
+    Content is compared by a 16-byte BLAKE2b hash of the stripped,
+    lower-cased text. Hashes are kept for the lifetime of the component and,
+    when ``persist_path`` is set, in a shelve file so later ingestion runs
+    skip chunks that were already indexed. ``run`` only reads that file;
+    call ``commit`` once the documents have been written to the store, so a
+    failed write never marks chunks as ingested. Delete the file to
+    re-ingest everything.
+
+    Args:
+        persist_path: Optional path of a shelve database for cross-run deduplication.
+    """
+
+    def __init__(self, persist_path: Optional[str] = None):
+        self.persist_path = persist_path
+        self._seen: Set[bytes] = set()
+        self._pending: Set[bytes] = set()
+
+    @staticmethod
+    def _digest(content: str) -> bytes:
+        return hashlib.blake2b(content.strip().lower().encode("utf-8"), digest_size=16).digest()
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        """
+        Filter out duplicate documents.
+
+        Args:
+            documents: Documents to deduplicate.
+
+        Returns:
+            Dictionary with the first occurrence of each distinct content.
+        """
+        db = shelve.open(self.persist_path) if self.persist_path else None
+        unique = []
+        try:
+            for doc in documents:
+                digest = self._digest(doc.content or "")
+                if digest in self._seen or (db is not None and digest.hex() in db):
+                    continue
+                self._seen.add(digest)
+                self._pending.add(digest)
+                unique.append(doc)
+        finally:
+            if db is not None:
+                db.close()
+
+        return {"documents": unique}
+
+    def commit(self) -> None:
+        """
+        Persist the hashes of documents passed on since the last commit.
+
+        Call only after those documents were written to the document store.
+        """
+        if self.persist_path and self._pending:
+            with shelve.open(self.persist_path) as db:
+                for digest in self._pending:
+                    db[digest.hex()] = True
+        self._pending.clear()
+
+
+@component
+class BatchedDocumentWriter:
+    """
+    Write documents to a document store in fixed-size batches, in parallel.
+
+    Each batch is one upsert request, so large ingests pay the HTTP round-trip
+    once per ``batch_size`` vectors. Batches are flushed concurrently on the
+    shared ``IO_POOL`` since upserts are I/O-bound.
+
+    Args:
+        document_store: The document store to write to.
+        batch_size: Number of documents per write (100 is Pinecone's recommended upsert size).
+        max_workers: Number of batches written concurrently.
+        policy: Policy applied to documents that already exist in the store.
+    """
+
+    def __init__(
+        self,
+        document_store,
+        batch_size: int = 100,
+        max_workers: int = 8,
+        policy: DuplicatePolicy = DuplicatePolicy.OVERWRITE
+    ):
+        self.document_store = document_store
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.policy = policy
+        self._store_ready = False
+
+    def warm_up(self) -> None:
+        """
+        Open the index on the calling thread before any parallel writes.
+
+        The Pinecone store connects to (and creates) its index lazily on first
+        access without a lock, so concurrent first writes would race.
+        """
+        if not self._store_ready:
+            self.document_store.count_documents()
+            self._store_ready = True
+
+    def _write_batch(self, batch: List[Document]) -> int:
+        return self.document_store.write_documents(batch, policy=self.policy)
+
+    @component.output_types(documents_written=int)
+    def run(self, documents: List[Document]):
+        """
+        Write documents to the document store.
+
+        Args:
+            documents: Documents to write.
+
+        Returns:
+            Dictionary with the number of documents written.
+        """
+        batches = [
+            documents[start:start + self.batch_size]
+            for start in range(0, len(documents), self.batch_size)
+        ]
+        if not batches:
+            return {"documents_written": 0}
+
+        self.warm_up()
+
+        # Keep at most max_workers upserts in flight on the shared pool
+        written = 0
+        pending = set()
+        for batch in batches:
+            if len(pending) >= self.max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                written += sum(future.result() for future in done)
+            pending.add(IO_POOL.submit(self._write_batch, batch))
+        written += sum(future.result() for future in wait(pending).done)
+
+        return {"documents_written": written}
+
+
+@component
+class FastPromptBuilder:
+    """
+    Build a prompt from a static prefix, the documents and a suffix.
+
+    A drop-in replacement for ``ChatPromptBuilder`` when the template is fixed:
+    the prompt is assembled with plain string joins instead of rendering a
+    Jinja template on every request, and sent as a single user message.
+
+    Args:
+        prefix: Text placed before the documents.
+        suffix: Text placed after the documents; ``{question}`` is replaced by the question.
+        separator: Text placed between documents.
+    """
+
+    def __init__(self, prefix: str, suffix: str, separator: str = "\n---\n"):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.separator = separator
+
+    @component.output_types(messages=List[ChatMessage])
+    def run(self, documents: List[Document], question: str):
+        """
+        Build the prompt.
+
+        Args:
+            documents: Documents to include as context.
+            question: The user's question.
+
+        Returns:
+            Dictionary with the rendered prompt as a list of chat messages.
+        """
+        context = self.separator.join(doc.content or "" for doc in documents)
+        prompt = self.prefix + context + self.suffix.format(question=question)
+        return {"messages": [ChatMessage.from_user(prompt)]}
+
+
+@component
+class ContextTrimmer:
+    """
+    Keep the highest-ranked documents that fit in a prompt token budget.
+
+    Documents are expected in rank order, as returned by the retriever.
+    Documents are kept until the next one would exceed the budget; the
+    top-ranked document is truncated if it alone is over the budget.
+
+    Args:
+        max_context_tokens: Maximum number of tokens of document content passed on.
+        encoding_model: Model name whose tiktoken encoding counts tokens.
+    """
+
+    def __init__(self, max_context_tokens: int = 1500, encoding_model: str = "gpt-3.5-turbo"):
+        self.max_context_tokens = max_context_tokens
+        self.encoding_model = encoding_model
+
+    def warm_up(self) -> None:
+        """
+        Load the tiktoken encoding before the first run.
+        """
+        get_encoding(self.encoding_model)
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        """
+        Trim documents to the token budget.
+
+        Args:
+            documents: Retrieved documents, highest-ranked first.
+
+        Returns:
+            Dictionary with the documents that fit in the budget.
+        """
+        encoding = get_encoding(self.encoding_model)
+
+        kept = []
+        used = 0
+        for doc in documents:
+            tokens = encoding.encode(doc.content or "")
+            if used + len(tokens) > self.max_context_tokens:
+                if not kept:
+                    kept.append(Document(
+                        content=encoding.decode(tokens[:self.max_context_tokens]),
+                        meta=doc.meta,
+                        score=doc.score
+                    ))
+                break
+            kept.append(doc)
+            used += len(tokens)
+
+        return {"documents": kept}
@@ -0,0 +1,123 @@
+"""
+ONNX Document Embedder
+======================
+INT8-quantized ONNX Runtime version of the sentence-transformers document embedder
+for faster CPU ingestion.
+
+Requires the optional ``optimum[onnxruntime]`` dependency (``pip install -e .[onnx]``).
+"""
+
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from haystack import Document, component
+
+
+DEFAULT_ONNX_CACHE_DIR = Path.home() / ".cache" / "qasystem" / "onnx"
+
+
+@component
+class ONNXDocumentEmbedder:
+    """
+    Embed documents with a dynamically INT8-quantized ONNX export of a
+    sentence-transformers model.
+
+    Exposes the same ``documents -> documents`` interface as
+    ``SentenceTransformersDocumentEmbedder``. Outputs are mean-pooled and
+    L2-normalized to match the sentence-transformers model.
+
+    Args:
+        model: Hugging Face model id of the sentence-transformers model.
+        batch_size: Number of documents encoded per forward pass.
+        max_length: Maximum number of tokens per document (384 for all-mpnet-base-v2).
+        cache_dir: Directory where the exported and quantized model is stored.
+    """
+
+    def __init__(
+        self,
+        model: str = "sentence-transformers/all-mpnet-base-v2",
+        batch_size: int = 32,
+        max_length: int = 384,
+        cache_dir: Optional[str] = None
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_ONNX_CACHE_DIR
+        self._model = None
+        self._tokenizer = None
+
+    def warm_up(self) -> None:
+        """
+        Export and quantize the model on first use, then load it.
+        """
+        if self._model is not None:
+            return
+
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        quantized_dir = self.cache_dir / self.model.replace("/", "__")
+        quantized_file = "model_quantized.onnx"
+
+        if not (quantized_dir / quantized_file).exists():
+            ort_model = ORTModelForFeatureExtraction.from_pretrained(self.model, export=True)
+            quantizer = ORTQuantizer.from_pretrained(ort_model)
+            # Dynamic INT8 quantization; VNNI dot-product kernels are used where available
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=quantized_dir, quantization_config=qconfig)
+            AutoTokenizer.from_pretrained(self.model).save_pretrained(quantized_dir)
+
+        self._model = ORTModelForFeatureExtraction.from_pretrained(
+            quantized_dir, file_name=quantized_file
+        )
+        self._tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        batch = self._tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        token_embeddings = self._model(
+            input_ids=batch["input_ids"],
+            attention_mask=batch["attention_mask"]
+        ).last_hidden_state
+
+        # Mean pooling over non-padding tokens, then L2 normalization
+        mask = batch["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        embeddings = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.clip(norms, 1e-12, None)
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        """
+        Embed a list of documents.
+
+        Args:
+            documents: Documents to embed.
+
+        Returns:
+            Dictionary with the documents, each with its ``embedding`` set.
+        """
+        if self._model is None:
+            raise RuntimeError("The embedding model has not been loaded. Please call warm_up() before running.")
+
+        texts = [doc.content or "" for doc in documents]
+
+        # Encode in length-sorted order so each batch pads as little as possible
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            embeddings = self._embed([texts[i] for i in indices])
+            for i, embedding in zip(indices, embeddings):
+                documents[i].embedding = embedding.tolist()
+
+        return {"documents": documents}
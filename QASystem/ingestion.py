@@ -4,25 +4,39 @@ Document Ingestion Pipeline
 Handles document loading, preprocessing, embedding generation, and storage in Pinecone.
 """
 
+import asyncio
+import mmap
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
-from haystack import Pipeline, Document
+from haystack import AsyncPipeline, Document
 from haystack.components.converters import TextFileToDocument, PyPDFToDocument
-from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
-from haystack.components.writers import DocumentWriter
+from haystack.components.preprocessors import DocumentCleaner
 from haystack.components.embedders import SentenceTransformersDocumentEmbedder
 
-from QASystem.utility import pinecone_config
+from QASystem._log import log
+from QASystem.components import BatchedDocumentWriter, ContentDeduper, TokenAwareSplitter
+from QASystem.utility import (
+    pinecone_config,
+    embedder_settings,
+    DEDUP_CACHE_PATH,
+    EMBEDDER_BACKEND,
+    IO_POOL
+)
 
 # Load environment variables
 load_dotenv()
 
+# Text files larger than this are split into several Documents while reading
+LARGE_TEXT_FILE_BYTES = 16 * 1024 * 1024
+TEXT_CHUNK_BYTES = 4 * 1024 * 1024
 
-def create_ingestion_pipeline(document_store) -> Pipeline:
+
+def create_ingestion_pipeline(document_store) -> AsyncPipeline:
     """
     Create a Haystack pipeline for document ingestion.
     
@@ -30,7 +44,7 @@ def create_ingestion_pipeline(document_store) -> Pipeline:
         document_store: The Pinecone document store to write documents to.
         
     Returns:
-        A configured Haystack Pipeline for document ingestion.
+        A configured Haystack AsyncPipeline for document ingestion.
     """
     # Initialize components
     document_cleaner = DocumentCleaner(
@@ -39,100 +53,230 @@ def create_ingestion_pipeline(document_store) -> Pipeline:
         remove_repeated_substrings=False
     )
     
-    document_splitter = DocumentSplitter(
-        split_by="sentence",
-        split_length=5,
-        split_overlap=1
+    # Chunks are sized in mpnet tokens and overlong sentences are cut, so no
+    # chunk is truncated by the model's 384-token window
+    document_splitter = TokenAwareSplitter(
+        model="sentence-transformers/all-mpnet-base-v2",
+        split_length=300,
+        split_overlap=15,
+        min_length=30
     )
     
-    document_embedder = SentenceTransformersDocumentEmbedder(
-        model="sentence-transformers/all-mpnet-base-v2"
-    )
+    # Boilerplate repeated across files is embedded and stored only once
+    document_deduper = ContentDeduper(persist_path=DEDUP_CACHE_PATH)
+    
+    # all-mpnet-base-v2 produces 768-dim vectors, matching the Pinecone index.
+    if EMBEDDER_BACKEND == "onnx":
+        from QASystem.embedder_onnx import ONNXDocumentEmbedder
+        document_embedder = ONNXDocumentEmbedder(
+            model="sentence-transformers/all-mpnet-base-v2"
+        )
+    else:
+        # sentence-transformers sorts each encode() call by text length before
+        # batching, so large batches keep padding per batch to a minimum.
+        document_embedder = SentenceTransformersDocumentEmbedder(
+            model="sentence-transformers/all-mpnet-base-v2",
+            batch_size=1024,
+            progress_bar=False,
+            **embedder_settings()
+        )
     
-    document_writer = DocumentWriter(
+    document_writer = BatchedDocumentWriter(
         document_store=document_store,
-        policy="upsert"
+        batch_size=100,
+        max_workers=8
     )
     
     # Build the pipeline
-    pipeline = Pipeline()
+    pipeline = AsyncPipeline()
     pipeline.add_component("cleaner", document_cleaner)
     pipeline.add_component("splitter", document_splitter)
+    pipeline.add_component("deduper", document_deduper)
     pipeline.add_component("embedder", document_embedder)
     pipeline.add_component("writer", document_writer)
     
     # Connect components
     pipeline.connect("cleaner", "splitter")
-    pipeline.connect("splitter", "embedder")
+    pipeline.connect("splitter", "deduper")
+    pipeline.connect("deduper", "embedder")
     pipeline.connect("embedder", "writer")
     
     return pipeline
 
 
-def load_documents_from_directory(directory_path: str, file_types: Optional[List[str]] = None) -> List[Document]:
+def _read_text(file_path: Path) -> str:
+    """
+    Read a UTF-8 text file through a read-only memory map.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.read().decode('utf-8')
+
+
+def _iter_text_chunks(file_path: Path, chunk_bytes: int = TEXT_CHUNK_BYTES) -> Iterator[str]:
+    """
+    Yield a memory-mapped UTF-8 text file in chunks that end on line boundaries.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            start = 0
+            while start < size:
+                end = min(start + chunk_bytes, size)
+                if end < size:
+                    newline = mm.find(b"\n", end)
+                    end = size if newline == -1 else newline + 1
+                yield mm[start:end].decode('utf-8')
+                start = end
+
+
+def _load_text_documents(file_path: Path) -> List[Document]:
+    """
+    Load a text file as one Document, or several for very large files.
+    """
+    meta = {"source": str(file_path), "filename": file_path.name}
+    if file_path.stat().st_size <= LARGE_TEXT_FILE_BYTES:
+        return [Document(content=_read_text(file_path), meta=meta)]
+    return [Document(content=chunk, meta=dict(meta)) for chunk in _iter_text_chunks(file_path)]
+
+
+def _read_txt(file_path: Path) -> Tuple[Path, List[Document], Optional[str]]:
+    """
+    Read a single text file into a Document.
+    
+    Returns:
+        Tuple of (path, documents, error message or None).
+    """
+    try:
+        return file_path, _load_text_documents(file_path), None
+    except Exception as e:
+        return file_path, [], str(e)
+
+
+def _parse_pdfs(file_paths: List[Path]) -> List[Tuple[Path, List[Document], Optional[str]]]:
+    """
+    Convert a batch of PDF files with a single converter run.
+    
+    Defined at module level so it can be pickled into worker processes.
+    
+    Returns:
+        One (path, documents, error message or None) tuple per input file.
+    """
+    try:
+        converter = PyPDFToDocument(store_full_path=True)
+        result = converter.run(sources=file_paths)
+    except Exception as e:
+        return [(file_path, [], str(e)) for file_path in file_paths]
+    
+    by_path = {str(file_path): [] for file_path in file_paths}
+    for doc in result["documents"]:
+        file_path = doc.meta.get("file_path")
+        doc.meta["source"] = file_path
+        doc.meta["filename"] = Path(file_path).name
+        by_path[file_path].append(doc)
+    
+    # The converter skips unreadable files, leaving them without documents
+    return [
+        (file_path, by_path[str(file_path)], None if by_path[str(file_path)] else "no content extracted")
+        for file_path in file_paths
+    ]
+
+
+def load_documents_from_directory(
+    directory_path: str,
+    file_types: Optional[List[str]] = None,
+    num_workers: Optional[int] = None
+) -> List[Document]:
     """
     Load documents from a directory.
     
+    PDF parsing is CPU-bound and is spread across worker processes;
+    text files are read on the shared IO_POOL since they are I/O-bound.
+    
     Args:
         directory_path: Path to the directory containing documents.
         file_types: List of file extensions to process (e.g., ['.txt', '.pdf']).
                    Defaults to ['.txt', '.pdf'].
+        num_workers: Number of worker processes for PDF parsing.
+                     Defaults to the number of CPUs; 1 parses in-process.
                    
     Returns:
         List of Haystack Document objects.
     """
     if file_types is None:
         file_types = ['.txt', '.pdf']
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
     
-    documents = []
     directory = Path(directory_path)
     
     if not directory.exists():
         raise FileNotFoundError(f"Directory not found: {directory_path}")
     
-    for file_path in directory.iterdir():
-        if file_path.is_file() and file_path.suffix.lower() in file_types:
-            try:
-                if file_path.suffix.lower() == '.txt':
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    doc = Document(
-                        content=content,
-                        meta={"source": str(file_path), "filename": file_path.name}
-                    )
-                    documents.append(doc)
-                    print(f"Loaded: {file_path.name}")
-                elif file_path.suffix.lower() == '.pdf':
-                    # For PDF files, we'll use PyPDFToDocument converter
-                    converter = PyPDFToDocument()
-                    result = converter.run(sources=[file_path])
-                    for doc in result["documents"]:
-                        doc.meta["source"] = str(file_path)
-                        doc.meta["filename"] = file_path.name
-                        documents.append(doc)
-                    print(f"Loaded: {file_path.name}")
-            except Exception as e:
-                print(f"Error loading {file_path.name}: {e}")
+    file_paths = [
+        file_path for file_path in sorted(directory.iterdir())
+        if file_path.is_file() and file_path.suffix.lower() in file_types
+    ]
+    txt_paths = [p for p in file_paths if p.suffix.lower() == '.txt']
+    pdf_paths = [p for p in file_paths if p.suffix.lower() == '.pdf']
+    
+    results = []
+    if txt_paths:
+        results.extend(IO_POOL.map(_read_txt, txt_paths))
+    if pdf_paths:
+        if num_workers > 1 and len(pdf_paths) > 1:
+            # One batch per worker so each process builds a single converter
+            workers = min(num_workers, len(pdf_paths))
+            batches = [pdf_paths[i::workers] for i in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for batch_results in executor.map(_parse_pdfs, batches):
+                    results.extend(batch_results)
+        else:
+            results.extend(_parse_pdfs(pdf_paths))
+    
+    # Keep the directory order regardless of which pool finished first
+    loaded = {}
+    for file_path, docs, error in results:
+        if error is not None:
+            log.error("Error loading %s: %s", file_path.name, error)
+        else:
+            loaded[file_path] = docs
+            log.info("Loaded: %s", file_path.name)
+    
+    documents = []
+    for file_path in file_paths:
+        documents.extend(loaded.get(file_path, []))
     
     return documents
 
 
-def ingest_documents(source_path: str, file_types: Optional[List[str]] = None) -> dict:
+async def ingest_documents(
+    source_path: str,
+    file_types: Optional[List[str]] = None,
+    num_workers: Optional[int] = None
+) -> dict:
     """
     Main function to ingest documents into Pinecone.
     
     Args:
         source_path: Path to directory containing documents or a single file.
         file_types: List of file extensions to process.
+        num_workers: Number of worker processes used to parse PDFs when
+                     ingesting a directory. Defaults to the number of CPUs.
         
     Returns:
         Dictionary with ingestion results.
     """
-    print("Starting document ingestion...")
+    log.info("Starting document ingestion...")
+    loop = asyncio.get_running_loop()
     
     # Initialize document store
     document_store = pinecone_config()
-    print("Pinecone document store initialized.")
+    log.info("Pinecone document store initialized.")
     
     # Load documents
     source = Path(source_path)
@@ -140,43 +284,42 @@ def ingest_documents(source_path: str, file_types: Optional[List[str]] = None) -
     if source.is_file():
         # Single file ingestion
         if source.suffix.lower() == '.txt':
-            with open(source, 'r', encoding='utf-8') as f:
-                content = f.read()
-            documents = [Document(
-                content=content,
-                meta={"source": str(source), "filename": source.name}
-            )]
+            documents = await loop.run_in_executor(IO_POOL, _load_text_documents, source)
         elif source.suffix.lower() == '.pdf':
-            converter = PyPDFToDocument()
-            result = converter.run(sources=[source])
-            documents = result["documents"]
-            for doc in documents:
-                doc.meta["source"] = str(source)
-                doc.meta["filename"] = source.name
+            _, documents, error = (await loop.run_in_executor(IO_POOL, _parse_pdfs, [source]))[0]
+            if error is not None:
+                raise RuntimeError(f"Error loading {source.name}: {error}")
         else:
             raise ValueError(f"Unsupported file type: {source.suffix}")
     elif source.is_dir():
-        documents = load_documents_from_directory(str(source), file_types)
+        # Not on IO_POOL: the loader fans its own file reads out onto it
+        documents = await asyncio.to_thread(
+            load_documents_from_directory, str(source), file_types, num_workers
+        )
     else:
         raise FileNotFoundError(f"Source path not found: {source_path}")
     
     if not documents:
         return {"status": "warning", "message": "No documents found to ingest.", "count": 0}
     
-    print(f"Loaded {len(documents)} documents.")
+    log.info("Loaded %d documents.", len(documents))
     
     # Create and run ingestion pipeline
     pipeline = create_ingestion_pipeline(document_store)
     
-    # Warm up embedder
-    pipeline.get_component("embedder").warm_up()
+    # Warm up every component (model loads, Pinecone index setup) off the event loop;
+    # run_async warms up again on the loop, which is then a no-op
+    await loop.run_in_executor(IO_POOL, pipeline.warm_up)
     
     # Run the pipeline
-    result = pipeline.run({"cleaner": {"documents": documents}})
+    result = await pipeline.run_async({"cleaner": {"documents": documents}})
+    
+    # Remember ingested chunks only now that the writer has succeeded
+    await loop.run_in_executor(IO_POOL, pipeline.get_component("deduper").commit)
     
     written_count = result.get("writer", {}).get("documents_written", len(documents))
     
-    print(f"Successfully ingested {written_count} document chunks into Pinecone.")
+    log.info("Successfully ingested %d document chunks into Pinecone.", written_count)
     
     return {
         "status": "success",
@@ -195,7 +338,7 @@ if __name__ == "__main__":
         source = "./data"
         
     try:
-        result = ingest_documents(source)
-        print(result)
+        result = asyncio.run(ingest_documents(source))
+        log.info("%s", result)
     except Exception as e:
-        print(f"Ingestion failed: {e}")
+        log.error("Ingestion failed: %s", e)
@@ -4,18 +4,34 @@ Retrieval and Generation Pipeline
 Implements the RAG (Retrieval-Augmented Generation) pipeline using Haystack AI.
 """
 
+import asyncio
+import logging
 import os
-from typing import Optional
+import threading
+from functools import lru_cache, partial
+from typing import AsyncIterator, List, Optional, Union
 
 from dotenv import load_dotenv
 
-from haystack import Pipeline
+from haystack import AsyncPipeline
+from haystack.dataclasses import StreamingChunk
 from haystack.components.embedders import SentenceTransformersTextEmbedder
-from haystack.components.builders import PromptBuilder
-from haystack_integrations.components.generators.groq import GroqGenerator
+from haystack.components.generators.chat import OpenAIChatGenerator
+from haystack.utils import Secret
 from haystack_integrations.components.retrievers.pinecone import PineconeEmbeddingRetriever
 
-from QASystem.utility import pinecone_config
+from QASystem._log import log
+from QASystem.cache import QueryCache, QueryKey
+from QASystem.components import ContextTrimmer, FastPromptBuilder
+from QASystem.utility import (
+    pinecone_config,
+    embedder_settings,
+    IO_POOL,
+    MAX_CONTEXT_TOKENS,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+    RAG_TOP_K
+)
 
 # Load environment variables
 load_dotenv()
@@ -25,76 +41,104 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if GROQ_API_KEY:
     os.environ["GROQ_API_KEY"] = GROQ_API_KEY
 
-# Define the prompt template for RAG
-RAG_PROMPT_TEMPLATE = """
+# Groq serves an OpenAI-compatible API
+GROQ_API_BASE_URL = "https://api.groq.com/openai/v1"
+
+# HTTP/2 client settings so generator calls reuse pooled keep-alive TLS connections
+GENERATOR_HTTP_CLIENT_KWARGS = {
+    "http2": True,
+    "limits": {"max_keepalive_connections": 32, "keepalive_expiry": 60}
+}
+
+# Define the prompt for RAG; retrieved documents go between the prefix and suffix
+RAG_PROMPT_PREFIX = """
 You are a helpful AI assistant. Answer the question based on the provided context.
 If the context doesn't contain relevant information to answer the question, 
 say "I don't have enough information to answer this question based on the available documents."
 
 Context:
-{% for document in documents %}
-{{ document.content }}
+"""
+
+RAG_PROMPT_SUFFIX = """
 ---
-{% endfor %}
 
-Question: {{ question }}
+Question: {question}
 
 Answer:
 """
 
 
-def create_rag_pipeline(document_store, top_k: int = 3) -> Pipeline:
+def create_rag_pipeline(
+    document_store,
+    top_k: int = 3,
+    max_context_tokens: int = 1500
+) -> AsyncPipeline:
     """
     Create a RAG (Retrieval-Augmented Generation) pipeline using Groq.
     
+    The pipeline starts at the retriever; the query embedding is computed
+    up front by ``embed_query`` so repeated questions reuse cached vectors.
+    
     Args:
         document_store: The Pinecone document store to retrieve from.
         top_k: Number of documents to retrieve.
+        max_context_tokens: Token budget for retrieved content in the prompt.
         
     Returns:
-        A configured Haystack Pipeline for RAG.
+        A configured Haystack AsyncPipeline for RAG.
     """
     # Initialize components
-    text_embedder = SentenceTransformersTextEmbedder(
-        model="sentence-transformers/all-mpnet-base-v2"
-    )
-    
     retriever = PineconeEmbeddingRetriever(
         document_store=document_store,
         top_k=top_k
     )
     
-    prompt_builder = PromptBuilder(template=RAG_PROMPT_TEMPLATE)
+    context_trimmer = ContextTrimmer(max_context_tokens=max_context_tokens)
+    
+    prompt_builder = FastPromptBuilder(prefix=RAG_PROMPT_PREFIX, suffix=RAG_PROMPT_SUFFIX)
     
-    generator = GroqGenerator(
+    generator = OpenAIChatGenerator(
+        api_key=Secret.from_env_var("GROQ_API_KEY"),
+        api_base_url=GROQ_API_BASE_URL,
         model="llama3-8b-8192",
         generation_kwargs={
             "max_tokens": 500,
             "temperature": 0.7
-        }
+        },
+        http_client_kwargs=GENERATOR_HTTP_CLIENT_KWARGS
     )
     
     # Build the pipeline
-    pipeline = Pipeline()
-    pipeline.add_component("text_embedder", text_embedder)
+    pipeline = AsyncPipeline()
     pipeline.add_component("retriever", retriever)
+    pipeline.add_component("context_trimmer", context_trimmer)
     pipeline.add_component("prompt_builder", prompt_builder)
     pipeline.add_component("generator", generator)
     
     # Connect components
-    pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
-    pipeline.connect("retriever.documents", "prompt_builder.documents")
-    pipeline.connect("prompt_builder", "generator")
+    pipeline.connect("retriever.documents", "context_trimmer.documents")
+    pipeline.connect("context_trimmer.documents", "prompt_builder.documents")
+    pipeline.connect("prompt_builder.messages", "generator.messages")
     
     return pipeline
 
 
 # Create a global pipeline instance for reuse
-_rag_pipeline: Optional[Pipeline] = None
+_rag_pipeline: Optional[AsyncPipeline] = None
 _document_store = None
 
+# Shared query embedder, loaded once on first use
+_text_embedder: Optional[SentenceTransformersTextEmbedder] = None
+
+# Guard the lazy singletons, which may be first created from worker threads
+_pipeline_lock = threading.Lock()
+_embedder_lock = threading.Lock()
+
+# Cache of generated answers keyed on the normalized question
+_answer_cache = QueryCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
 
-def get_rag_pipeline() -> Pipeline:
+
+def get_rag_pipeline() -> AsyncPipeline:
     """
     Get or create the RAG pipeline singleton.
     
@@ -104,55 +148,222 @@ def get_rag_pipeline() -> Pipeline:
     global _rag_pipeline, _document_store
     
     if _rag_pipeline is None:
-        print("Initializing RAG pipeline...")
-        _document_store = pinecone_config()
-        _rag_pipeline = create_rag_pipeline(_document_store)
-        
-        # Warm up the embedder
-        _rag_pipeline.get_component("text_embedder").warm_up()
-        print("RAG pipeline initialized successfully.")
+        with _pipeline_lock:
+            if _rag_pipeline is None:
+                log.info("Initializing RAG pipeline...")
+                _document_store = pinecone_config()
+                _rag_pipeline = create_rag_pipeline(
+                    _document_store,
+                    top_k=RAG_TOP_K,
+                    max_context_tokens=MAX_CONTEXT_TOKENS
+                )
+                log.info("RAG pipeline initialized successfully.")
     
     return _rag_pipeline
 
 
-def get_result(question: str) -> str:
+def get_text_embedder() -> SentenceTransformersTextEmbedder:
     """
-    Get an answer to a question using the RAG pipeline.
+    Get or create the query embedder singleton.
     
-    This is the main function called by the FastAPI application.
+    Returns:
+        The warmed-up text embedder instance.
+    """
+    global _text_embedder
+    
+    if _text_embedder is None:
+        with _embedder_lock:
+            if _text_embedder is None:
+                text_embedder = SentenceTransformersTextEmbedder(
+                    model="sentence-transformers/all-mpnet-base-v2",
+                    batch_size=1,
+                    progress_bar=False,
+                    **embedder_settings()
+                )
+                text_embedder.warm_up()
+                _text_embedder = text_embedder
+    
+    return _text_embedder
+
+
+@lru_cache(maxsize=2048)
+def _embed_normalized(key: QueryKey) -> tuple:
+    return tuple(get_text_embedder().run(text=key.text)["embedding"])
+
+
+def embed_query(query: Union[str, QueryKey]) -> List[float]:
+    """
+    Embed a query, reusing the vector for previously seen questions.
     
     Args:
-        question: The user's question.
+        query: The query to embed, or its precomputed QueryKey.
         
     Returns:
-        The generated answer based on retrieved context.
+        The query embedding.
     """
-    if not question or not question.strip():
-        return "Please provide a valid question."
+    if isinstance(query, str):
+        query = QueryKey.from_question(query)
+    return list(_embed_normalized(query))
+
+
+async def warmup() -> None:
+    """
+    Pay the one-time start-up costs before the first request arrives.
+    
+    Builds the RAG pipeline and Pinecone store, loads the query embedder,
+    and runs one dummy async retrieval so the async Pinecone index used by
+    requests is opened before concurrent requests can race to open it.
+    Failures are logged rather than raised so the app still starts; the
+    same errors then surface on the first request.
+    """
+    loop = asyncio.get_running_loop()
     
     try:
-        # Get the pipeline
-        pipeline = get_rag_pipeline()
+        pipeline, text_embedder = await asyncio.gather(
+            loop.run_in_executor(IO_POOL, get_rag_pipeline),
+            loop.run_in_executor(IO_POOL, get_text_embedder)
+        )
+        await loop.run_in_executor(IO_POOL, pipeline.warm_up)
+        
+        result = await loop.run_in_executor(IO_POOL, partial(text_embedder.run, text="warmup"))
+        # Requests retrieve through run_async, which opens its own async Pinecone index
+        retriever = pipeline.get_component("retriever")
+        await retriever.run_async(query_embedding=result["embedding"])
+        log.info("RAG pipeline warmed up.")
+    except Exception as e:
+        log.warning("RAG pipeline warm-up failed: %s", e)
+
+
+# Marks the end of a streamed answer
+_STREAM_END = object()
+
+
+class StreamInterrupted(Exception):
+    """
+    Raised by ``stream_result`` when generation fails after part of the
+    answer was already yielded; the message describes the error.
+    """
+
+
+async def stream_result(question: str) -> AsyncIterator[str]:
+    """
+    Stream an answer to a question using the RAG pipeline.
+    
+    Tokens are yielded as the generator produces them. The pipeline runs
+    asynchronously so concurrent requests overlap their Pinecone and Groq
+    round-trips instead of blocking the event loop. Answers are cached per
+    normalized question, so repeated questions skip embedding, retrieval
+    and generation until the entry expires and are yielded in one piece.
+    
+    Args:
+        question: The user's question.
         
-        # Run the pipeline
-        result = pipeline.run({
-            "text_embedder": {"text": question},
-            "prompt_builder": {"question": question}
-        })
+    Yields:
+        Chunks of the generated answer based on retrieved context.
         
-        # Extract the answer
-        if result and "generator" in result:
-            replies = result["generator"].get("replies", [])
-            if replies:
-                return replies[0]
+    Raises:
+        StreamInterrupted: If an error occurs after chunks were yielded;
+            errors before the first chunk are yielded as the answer instead.
+    """
+    if not question or not question.strip():
+        yield "Please provide a valid question."
+        return
+    
+    # Normalize and hash once; the key is shared by the answer and embedding caches
+    cache_key = QueryKey.from_question(question)
+    cached_answer = _answer_cache.get(cache_key)
+    if cached_answer is not None:
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Answer cache hit for %r", cache_key.text)
+        yield cached_answer
+        return
+    
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    def on_chunk(chunk: StreamingChunk) -> None:
+        # Called from the generator's worker thread
+        if chunk.content:
+            loop.call_soon_threadsafe(queue.put_nowait, chunk.content)
+    
+    async def run_pipeline() -> dict:
+        try:
+            # The transformer forward pass is CPU-bound, so embed off the event loop.
+            # On a cold start, embed while the pipeline and its Pinecone client are set up.
+            if _rag_pipeline is not None:
+                pipeline = _rag_pipeline
+                query_embedding = await loop.run_in_executor(IO_POOL, embed_query, cache_key)
             else:
-                return "I couldn't generate an answer. Please try again."
-        else:
-            return "An error occurred while processing your question."
+                pipeline, query_embedding = await asyncio.gather(
+                    loop.run_in_executor(IO_POOL, get_rag_pipeline),
+                    loop.run_in_executor(IO_POOL, embed_query, cache_key)
+                )
             
+            # Run the pipeline
+            return await pipeline.run_async({
+                "retriever": {"query_embedding": query_embedding},
+                "prompt_builder": {"question": question},
+                "generator": {"streaming_callback": on_chunk}
+            })
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+    
+    task = asyncio.create_task(run_pipeline())
+    streamed = False
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _STREAM_END:
+                break
+            streamed = True
+            yield chunk
+        
+        result = await task
     except Exception as e:
-        print(f"Error in get_result: {e}")
-        return f"An error occurred: {str(e)}"
+        log.error("Error in stream_result: %s", e)
+        if streamed:
+            raise StreamInterrupted(f"An error occurred: {str(e)}") from e
+        yield f"An error occurred: {str(e)}"
+        return
+    finally:
+        # The client went away mid-stream
+        if not task.done():
+            task.cancel()
+    
+    # Extract the answer
+    if result and "generator" in result:
+        replies = result["generator"].get("replies", [])
+        if replies:
+            answer = replies[0].text or ""
+            _answer_cache.put(cache_key, answer)
+            if not streamed:
+                yield answer
+        else:
+            yield "I couldn't generate an answer. Please try again."
+    else:
+        yield "An error occurred while processing your question."
+
+
+async def get_result(question: str) -> str:
+    """
+    Get an answer to a question using the RAG pipeline.
+    
+    Non-streaming wrapper around ``stream_result`` that joins the chunks.
+    If generation fails midway, only the error message is returned.
+    
+    Args:
+        question: The user's question.
+        
+    Returns:
+        The generated answer based on retrieved context.
+    """
+    chunks = []
+    try:
+        async for chunk in stream_result(question):
+            chunks.append(chunk)
+    except StreamInterrupted as e:
+        return str(e)
+    return "".join(chunks)
 
 
 def retrieve_documents(question: str, top_k: int = 5) -> list:
@@ -170,29 +381,18 @@ def retrieve_documents(question: str, top_k: int = 5) -> list:
     """
     document_store = pinecone_config()
     
-    text_embedder = SentenceTransformersTextEmbedder(
-        model="sentence-transformers/all-mpnet-base-v2"
-    )
-    text_embedder.warm_up()
-    
     retriever = PineconeEmbeddingRetriever(
         document_store=document_store,
         top_k=top_k
     )
     
-    # Create a simple retrieval pipeline
-    pipeline = Pipeline()
-    pipeline.add_component("text_embedder", text_embedder)
-    pipeline.add_component("retriever", retriever)
-    pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
-    
-    result = pipeline.run({"text_embedder": {"text": question}})
+    result = retriever.run(query_embedding=embed_query(question))
     
-    return result.get("retriever", {}).get("documents", [])
+    return result.get("documents", [])
 
 
 if __name__ == "__main__":
     # Test the RAG pipeline
     test_question = "What is this document about?"
-    print(f"Question: {test_question}")
-    print(f"Answer: {get_result(test_question)}")
+    log.info("Question: %s", test_question)
+    log.info("Answer: %s", asyncio.run(get_result(test_question)))
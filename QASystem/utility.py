@@ -5,9 +5,15 @@ Configuration and helper functions for Pinecone and other services.
 """
 
 from haystack_integrations.document_stores.pinecone import PineconeDocumentStore
+import atexit
+import functools
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from QASystem._log import log
+
 # Load environment variables
 load_dotenv()
 
@@ -15,9 +21,52 @@ load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 if PINECONE_API_KEY:
     os.environ['PINECONE_API_KEY'] = PINECONE_API_KEY
-    print("Pinecone API key loaded successfully.")
+    log.info("Pinecone API key loaded successfully.")
 else:
-    print("Warning: PINECONE_API_KEY not found in environment variables.")
+    log.warning("PINECONE_API_KEY not found in environment variables.")
+
+# Shared thread pool for all I/O-bound work (file reads, upserts, async offloading)
+IO_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("QA_IO_THREADS", "32")),
+    thread_name_prefix="qa-io"
+)
+atexit.register(IO_POOL.shutdown)
+
+# Query cache configuration
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+# Retrieval configuration: documents fetched per query and their total token budget
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "1500"))
+
+# Optional shelve file remembering ingested chunk hashes across runs
+DEDUP_CACHE_PATH = os.getenv("DEDUP_CACHE_PATH")
+
+# Document embedder backend: "torch" (sentence-transformers) or "onnx" (INT8 ONNX Runtime)
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "torch").lower()
+
+# Embedder precision on GPU: "auto" uses FP16 when CUDA is available, "fp32" disables it
+EMBEDDER_PRECISION = os.getenv("EMBEDDER_PRECISION", "auto").lower()
+
+
+# Serializes first-time creation of cached document stores across threads
+_pinecone_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=8)
+def _create_document_store(
+    index_name: str,
+    namespace: str,
+    dimension: int,
+    metric: str
+) -> PineconeDocumentStore:
+    return PineconeDocumentStore(
+        index=index_name,
+        namespace=namespace,
+        dimension=dimension,
+        metric=metric
+    )
 
 
 def pinecone_config(
@@ -37,7 +86,8 @@ def pinecone_config(
         metric: Distance metric for similarity search (default: "cosine")
         
     Returns:
-        Configured PineconeDocumentStore instance.
+        Configured PineconeDocumentStore instance. Calls with the same
+        arguments return the same cached instance.
         
     Note:
         Make sure to set PINECONE_API_KEY in your environment variables or .env file.
@@ -48,14 +98,31 @@ def pinecone_config(
             "PINECONE_API_KEY not found. Please set it in your .env file or environment variables."
         )
     
-    document_store = PineconeDocumentStore(
-        index=index_name,
-        namespace=namespace,
-        dimension=dimension,
-        metric=metric
-    )
+    with _pinecone_lock:
+        return _create_document_store(index_name, namespace, dimension, metric)
+
+
+def embedder_settings() -> dict:
+    """
+    Get device and precision arguments for the sentence-transformers embedders.
+    
+    On CUDA the model is loaded in FP16 unless EMBEDDER_PRECISION is "fp32".
+    On CPU the model stays FP32 and torch is allowed to use every core.
+    
+    Returns:
+        Keyword arguments for SentenceTransformers*Embedder constructors.
+    """
+    import torch
+    from haystack.utils import ComponentDevice
+    
+    if torch.cuda.is_available():
+        settings = {"device": ComponentDevice.from_str("cuda:0")}
+        if EMBEDDER_PRECISION != "fp32":
+            settings["model_kwargs"] = {"torch_dtype": torch.float16}
+        return settings
     
-    return document_store
+    torch.set_num_threads(os.cpu_count() or 1)
+    return {"device": ComponentDevice.from_str("cpu")}
 
 
 def get_environment_info() -> dict:
@@ -74,10 +141,10 @@ def get_environment_info() -> dict:
 
 if __name__ == "__main__":
     # Test configuration
-    print("Environment Info:", get_environment_info())
+    log.info("Environment Info: %s", get_environment_info())
     
     try:
         store = pinecone_config()
-        print("Pinecone document store configured successfully!")
+        log.info("Pinecone document store configured successfully!")
     except Exception as e:
-        print(f"Error configuring Pinecone: {e}")
\ No newline at end of file
+        log.error("Error configuring Pinecone: %s", e)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Request, Form, Response
+from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.encoders import jsonable_encoder
 import uvicorn
@@ -6,7 +7,7 @@ from fastapi import FastAPI
 import json
 import os
 from dotenv import load_dotenv
-from QASystem.retrievalandgenerator import get_result
+from QASystem.retrievalandgenerator import StreamInterrupted, get_result, stream_result, warmup
 
 #loading the environment variable
 load_dotenv()
@@ -20,6 +21,11 @@ app = FastAPI()
 # Configure templates
 templates = Jinja2Templates(directory="templates")
 
+# load the models and open connections before serving the first request
+@app.on_event("startup")
+async def _startup():
+    await warmup()
+
 #creating the routes with bind functions
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon():
@@ -32,10 +38,22 @@ async def index(request: Request):
 @app.post("/get_answer")
 async def get_answer(request: Request, question: str = Form(...)):
     print(question)
-    result = get_result(question)
+    result = await get_result(question)
     # result is already a dict with "answer" and "context"
     res = Response(json.dumps(result), media_type="application/json")
     return res
+
+@app.post("/stream_answer")
+async def stream_answer(request: Request, question: str = Form(...)):
+    # each chunk is sent as a JSON-encoded server-sent event;
+    # a failure after partial output is sent as a separate "error" event
+    async def events():
+        try:
+            async for chunk in stream_result(question):
+                yield f"data: {json.dumps(chunk)}\n\n"
+        except StreamInterrupted as e:
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream")
     
 if __name__ == "__main__":
     uvicorn.run("app:app",host="127.0.0.1",port=8000,reload=True)
\ No newline at end of file
@@ -6,5 +6,7 @@ setup(
     author="Tushar",
     author_email="td220627@gmail.com",
     packages=find_packages(),
-    install_requires=["pinecone-haystack","haystack-ai","fastapi","uvicorn","python-dotenv","pathlib","pypdf","sentence-transformers","groq-haystack"]
+    python_requires=">=3.10",
+    install_requires=["pinecone-haystack","haystack-ai>=2.28,<3","fastapi","uvicorn","python-dotenv","pathlib","pypdf","sentence-transformers","httpx[http2]","nltk","tiktoken"],
+    extras_require={"onnx": ["optimum[onnxruntime]"]}
 )
\ No newline at end of file